@@ -1,5 +1,5 @@
 from .main import BaseModel
-from .exceptions import DoesNotExist, ConditionCheckFailed
+from .exceptions import DoesNotExist, ConditionCheckFailed, BatchGetIncomplete
 from .backends.sqlite import Backend as SqliteBackend
 from .backends.dynamodb import Backend as DynamoDbBackend
 
@@ -7,6 +7,7 @@ __all__ = [
     "BaseModel",
     "DoesNotExist",
     "ConditionCheckFailed",
+    "BatchGetIncomplete",
     "SqliteBackend",
     "DynamoDbBackend",
 ]
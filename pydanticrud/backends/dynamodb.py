@@ -1,66 +1,163 @@
-from typing import Optional, Set, Union, Dict, Any
+from typing import Optional, Set, Union, Dict, Any, Iterable
 import logging
 import json
-from datetime import datetime, timezone
+import random
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from threading import Lock
+from time import sleep
+from weakref import WeakKeyDictionary
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
 import boto3
-from boto3.dynamodb.conditions import Key, Attr
+import botocore.session
+from boto3.dynamodb.conditions import Key, Attr, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
 from boto3.exceptions import DynamoDBNeedsKeyConditionError
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from botocore.parsers import JSONParser, ResponseParserFactory
 from rule_engine import Rule, ast, types
 
+try:
+    import orjson
+
+    def dump_json(value) -> str:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    load_json = orjson.loads
+except ImportError:
+    dump_json = json.dumps
+    load_json = json.loads
+
 from ..main import IterableResult
-from ..exceptions import DoesNotExist, ConditionCheckFailed
+from ..exceptions import DoesNotExist, ConditionCheckFailed, BatchGetIncomplete
 
 log = logging.getLogger(__name__)
 
 
-def expression_to_condition(expr, keys: set):
-    if isinstance(expr, ast.LogicExpression):
-        left, l_keys = expression_to_condition(expr.left, keys)
-        right, r_keys = expression_to_condition(expr.right, keys)
-        if expr.type == "and":
-            return left & right, l_keys | r_keys
-        if expr.type == "or":
-            return left | right, l_keys | r_keys
-    if isinstance(expr, ast.ComparisonExpression):
-        left, l_keys = expression_to_condition(expr.left, keys)
-        right, r_keys = expression_to_condition(expr.right, keys)
-        exit_keys = l_keys | r_keys
-        if expr.type == "eq":
-            if right is not None:
-                return left.eq(right), exit_keys
-            else:
-                return left.not_exists(), exit_keys
-        if expr.type == "ne":
-            if right is not None:
-                return left.ne(right), exit_keys
-            else:
-                return left.exists(), exit_keys
-        return getattr(left, {"le": "lte", "ge": "gte"}.get(expr.type, expr.type))(right), exit_keys
-    if isinstance(expr, ast.SymbolExpression):
-        if keys is not None and expr.name in keys:
-            return Key(expr.name), {expr.name}
-        return Attr(expr.name), set()
-    if isinstance(expr, ast.NullExpression):
-        return None, set()
-    if isinstance(expr, ast.DatetimeExpression):
-        return _to_epoch_decimal(expr.value), set()
-    if isinstance(expr, ast.StringExpression):
-        return expr.value, set()
-    if isinstance(expr, ast.FloatExpression):
-        val = expr.value
-        return val if not types.is_integer_number(val) else int(val), set()
-    if isinstance(expr, ast.ContainsExpression):
-        container, l_keys = expression_to_condition(expr.container, keys)
-        member, r_keys = expression_to_condition(expr.member, keys)
-        return container.contains(member), l_keys | r_keys
+def _logic_condition(expr, keys: set):
+    left, l_keys = expression_to_condition(expr.left, keys)
+    right, r_keys = expression_to_condition(expr.right, keys)
+    if expr.type == "and":
+        return left & right, l_keys | r_keys
+    if expr.type == "or":
+        return left | right, l_keys | r_keys
     raise NotImplementedError
 
 
+# rule_engine comparison types whose boto3 condition method is named differently.
+CONDITION_METHODS = {"le": "lte", "ge": "gte"}
+
+
+def _comparison_condition(expr, keys: set):
+    left, l_keys = expression_to_condition(expr.left, keys)
+    right, r_keys = expression_to_condition(expr.right, keys)
+    exit_keys = l_keys | r_keys
+    if expr.type == "eq":
+        if right is not None:
+            return left.eq(right), exit_keys
+        else:
+            return left.not_exists(), exit_keys
+    if expr.type == "ne":
+        if right is not None:
+            return left.ne(right), exit_keys
+        else:
+            return left.exists(), exit_keys
+    return getattr(left, CONDITION_METHODS.get(expr.type, expr.type))(right), exit_keys
+
+
+def _symbol_condition(expr, keys: set):
+    if keys is not None and expr.name in keys:
+        return Key(expr.name), {expr.name}
+    return Attr(expr.name), set()
+
+
+def _float_condition(expr, keys: set):
+    val = expr.value
+    return val if not types.is_integer_number(val) else int(val), set()
+
+
+def _contains_condition(expr, keys: set):
+    container, l_keys = expression_to_condition(expr.container, keys)
+    member, r_keys = expression_to_condition(expr.member, keys)
+    return container.contains(member), l_keys | r_keys
+
+
+# Keyed on the exact node type so each node costs one dict lookup instead of an isinstance() ladder.
+CONDITION_HANDLERS = {
+    ast.LogicExpression: _logic_condition,
+    ast.ComparisonExpression: _comparison_condition,
+    ast.ArithmeticComparisonExpression: _comparison_condition,
+    ast.SymbolExpression: _symbol_condition,
+    ast.NullExpression: lambda expr, keys: (None, set()),
+    ast.DatetimeExpression: lambda expr, keys: (_to_epoch_decimal(expr.value), set()),
+    ast.StringExpression: lambda expr, keys: (expr.value, set()),
+    ast.FloatExpression: _float_condition,
+    ast.ContainsExpression: _contains_condition,
+}
+
+
+def expression_to_condition(expr, keys: set):
+    try:
+        handler = CONDITION_HANDLERS[type(expr)]
+    except KeyError:
+        raise NotImplementedError
+    return handler(expr, keys)
+
+
+# Compiled conditions for each live Rule, keyed by the set of keys they were compiled against.
+_compiled_rules: "WeakKeyDictionary[Rule, dict]" = WeakKeyDictionary()
+
+
 def rule_to_boto_expression(rule: Rule, keys: Optional[Set[str]] = None):
-    return expression_to_condition(rule.statement.expression, keys or set())
+    """
+    Convert a rule into a boto3 condition and the set of keys it uses. A Rule never changes once
+    parsed, so the result is memoized for as long as the rule is alive.
+    """
+    keys = frozenset(keys or ())
+    compiled = _compiled_rules.setdefault(rule, {})
+    if keys not in compiled:
+        condition, keys_used = expression_to_condition(rule.statement.expression, keys)
+        compiled[keys] = condition, frozenset(keys_used)
+    return compiled[keys]
+
+
+def split_conjunction(expr) -> list:
+    """Flatten a tree of `and` expressions into the list of its operands."""
+    if isinstance(expr, ast.LogicExpression) and expr.type == "and":
+        return split_conjunction(expr.left) + split_conjunction(expr.right)
+    return [expr]
+
+
+def is_key_comparison(expr, key_name: str, types=("eq",)) -> bool:
+    """
+    Detect `key_name <op> <literal>`, which DynamoDB can answer with a key condition. Hash keys only
+    support equality, range keys also support ordering comparisons.
+    """
+    return (
+        isinstance(expr, ast.ComparisonExpression)
+        and expr.type in types
+        and isinstance(expr.left, ast.SymbolExpression)
+        and expr.left.name == key_name
+        and isinstance(expr.right, (ast.StringExpression, ast.FloatExpression))
+    )
+
+
+def expression_symbols(expr) -> set:
+    """Collect the names of every field an expression refers to."""
+    if isinstance(expr, ast.SymbolExpression):
+        return {expr.name}
+    names = set()
+    for attr in ("left", "right", "container", "member"):
+        child = getattr(expr, attr, None)
+        if isinstance(child, ast.ExpressionBase):
+            names |= expression_symbols(child)
+    return names
+
+
+RANGE_KEY_COMPARISONS = ("eq", "lt", "le", "gt", "ge")
 
 
 # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/customizations/dynamodb.html#valid-dynamodb-types
@@ -72,14 +169,15 @@ DYNAMO_TYPE_MAP = {
 }
 
 EPOCH = datetime(1970, 1, 1, 0, 0)
+EPOCH_UTC = EPOCH.replace(tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
 
 
 def _to_epoch_decimal(dt: datetime) -> Decimal:
     """TTL fields must be stored as a float but boto only supports decimals."""
-    epock = EPOCH
-    if dt.tzinfo:
-        epock = epock.replace(tzinfo=timezone.utc)
-    return Decimal((dt - epock).total_seconds())
+    # Count whole microseconds so the Decimal is exact instead of the binary expansion of a float.
+    micros = (dt - (EPOCH_UTC if dt.tzinfo else EPOCH)) // ONE_MICROSECOND
+    return Decimal(micros) / 1_000_000
 
 
 SERIALIZE_MAP = {
@@ -88,18 +186,175 @@ SERIALIZE_MAP = {
     "string:date-time": lambda d: d.isoformat(),
     "string:ttl": lambda d: _to_epoch_decimal(d),
     "boolean": lambda d: 1 if d else 0,
-    "object": json.dumps,
-    "array": json.dumps,
+    "object": dump_json,
+    "array": dump_json,
 }
 
 DESERIALIZE_MAP = {
     "number": float,
     "boolean": bool,
-    "object": json.loads,
-    "array": json.loads,
+    "object": load_json,
+    "array": load_json,
 }
 
 
+# The default pool only holds 10 connections and doesn't keep them alive, so bursts of concurrent
+# requests pay for new TLS handshakes.
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "max_attempts": 5},
+)
+
+_connection_lock = Lock()
+_connections: Dict[tuple, Any] = {}
+
+
+class RawJSONParser(JSONParser):
+    def _handle_json_body(self, raw_body, shape):
+        # Skip walking the output shape. Attribute values are left in their wire format
+        # ({"S": "..."}), which is exactly what TYPE_DESERIALIZER reads anyway.
+        return self._parse_body_as_json(raw_body)
+
+
+class RawResponseParserFactory(ResponseParserFactory):
+    def create_parser(self, protocol_name):
+        if protocol_name == "json":
+            return RawJSONParser(**self._defaults)
+        return super().create_parser(protocol_name)
+
+
+class _DefaultSessionCredentials:
+    """Credential provider that hands out whatever boto3's default session resolves."""
+
+    def __init__(self, session: boto3.Session):
+        self.session = session
+
+    def load_credentials(self):
+        return self.session.get_credentials()
+
+
+def _create_client(region_name: Optional[str] = None, **kwargs):
+    """
+    Create a low-level client that doesn't parse response bodies against the service model. On large
+    reads botocore's shape parsing costs as much as deserializing the items themselves, only to
+    produce the same attribute value dicts. The parser factory is a session component, so the client
+    gets its own session to avoid affecting any other client. That session takes its credentials,
+    profile and region from boto3's default session (the one `boto3.resource` uses), so anything set
+    with `boto3.setup_default_session()` applies to reads and writes as well as table management.
+    """
+    if boto3.DEFAULT_SESSION is None:
+        boto3.setup_default_session()
+    default_session = boto3.DEFAULT_SESSION
+
+    botocore_session = botocore.session.Session()
+    if default_session.profile_name in default_session.available_profiles:
+        botocore_session.set_config_variable("profile", default_session.profile_name)
+    botocore_session.register_component(
+        "credential_provider", _DefaultSessionCredentials(default_session)
+    )
+    botocore_session.register_component("response_parser_factory", RawResponseParserFactory())
+    return boto3.Session(botocore_session=botocore_session).client(
+        "dynamodb", region_name=region_name or default_session.region_name, **kwargs
+    )
+
+
+def _get_connection(create, region_name: str, endpoint_url: Optional[str] = None):
+    """
+    Return a DynamoDB client or service resource shared by every model using the same region and
+    endpoint.
+
+    Creating either one loads the service model and sets up a connection pool, so we only want to do it
+    once per process rather than once per model class.
+    """
+    key = (create, region_name, endpoint_url)
+    with _connection_lock:
+        if key not in _connections:
+            _connections[key] = create(
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=BOTO_CONFIG,
+            )
+        return _connections[key]
+
+
+def _create_resource(**kwargs):
+    return boto3.resource("dynamodb", **kwargs)
+
+
+def get_resource(region_name: str, endpoint_url: Optional[str] = None):
+    return _get_connection(_create_resource, region_name, endpoint_url)
+
+
+def _create_dax_client(region_name: str, endpoint_url: str, config=None):
+    # Only needed when a model is configured for DAX, so amazondax stays an optional dependency.
+    from amazondax import AmazonDaxClient
+
+    return AmazonDaxClient(region_name=region_name, endpoint_url=endpoint_url)
+
+
+def get_dax_client(region_name: str, endpoint_url: str):
+    """
+    DAX speaks the same low-level API as the DynamoDB client, serving reads from its in-memory cache
+    and writing through to the table.
+    """
+    return _get_connection(_create_dax_client, region_name, endpoint_url)
+
+
+def get_client(region_name: str, endpoint_url: Optional[str] = None):
+    """
+    The low-level client skips the resource layer's per-request parameter walking, so the simple
+    item operations use it with our own (stateless, shared) type (de)serializers.
+    """
+    return _get_connection(_create_client, region_name, endpoint_url)
+
+
+TYPE_SERIALIZER = TypeSerializer()
+TYPE_DESERIALIZER = TypeDeserializer()
+
+
+def to_attribute_values(data: dict) -> dict:
+    return {k: TYPE_SERIALIZER.serialize(v) for k, v in data.items()}
+
+
+def from_attribute_values(item: dict) -> dict:
+    return {k: TYPE_DESERIALIZER.deserialize(v) for k, v in item.items()}
+
+
+def client_params(params: dict) -> dict:
+    """
+    Express the boto3 conditions in a set of request parameters as the low-level client's expression
+    strings and serialized placeholder values. One builder is shared so placeholders never collide.
+    """
+    builder = ConditionExpressionBuilder()
+    names = dict(params.get("ExpressionAttributeNames", {}))
+    values = {}
+    result = dict(params)
+    for key in ("KeyConditionExpression", "FilterExpression", "ConditionExpression"):
+        if key in params:
+            built = builder.build_expression(
+                params[key], is_key_condition=key == "KeyConditionExpression"
+            )
+            result[key] = built.condition_expression
+            names.update(built.attribute_name_placeholders)
+            values.update(built.attribute_value_placeholders)
+    if names:
+        result["ExpressionAttributeNames"] = names
+    if values:
+        result["ExpressionAttributeValues"] = to_attribute_values(values)
+    return result
+
+
+# Batch requests that come back partially processed are resent this many times in total, waiting a
+# random ("full jitter") delay of up to BATCH_BACKOFF * 2**attempt seconds before each retry.
+BATCH_ATTEMPTS = 5
+BATCH_BACKOFF = 0.05
+
+
+def backoff_delay(attempt: int) -> float:
+    return random.uniform(0, BATCH_BACKOFF * 2**attempt)
+
+
 def chunk_list(lst, size):
     for i in range(0, len(lst), size):
         yield lst[i : i + size]
@@ -126,6 +381,20 @@ class DynamoSerializer:
         self.definitions = schema.get("$defs")
         self.ttl_field = ttl_field
 
+        # The schema never changes, so work out each field's converters once rather than per value.
+        self._serializers = {}
+        self._deserializers = {}
+        for field_name in set(self.properties or ()) | {ttl_field} - {None}:
+            field_types = self._get_type_possibilities(field_name)
+            deserializers = self._converters(field_types, DESERIALIZE_MAP)
+            if deserializers:
+                self._deserializers[field_name] = deserializers
+            if field_name == self.ttl_field:
+                field_types = {("string", "ttl")}
+            serializers = self._converters(field_types, SERIALIZE_MAP)
+            if serializers:
+                self._serializers[field_name] = serializers
+
     def _get_type_possibilities(self, field_name) -> Set[tuple]:
         field_properties = self.properties.get(field_name)
 
@@ -148,59 +417,45 @@ class DynamoSerializer:
 
         return set([(t["type"], t.get("format", "")) for t in type_dicts])
 
-    def _serialize_field(self, field_name, value):
-        if field_name == self.ttl_field:
-            field_types = {("string", "ttl")}
-        else:
-            field_types = self._get_type_possibilities(field_name)
-
-        if value is not None:
-            for t in field_types:
+    def _converters(self, field_types, converter_map) -> tuple:
+        """Resolve the converter for each possible type of a field, most specific format first."""
+        converters = []
+        for t in field_types:
+            type_signature = ":".join(t).rstrip(":")
+            converter = converter_map.get(type_signature, converter_map.get(t[0]))
+            if converter is not None:
+                converters.append(converter)
+        return tuple(converters)
+
+    @staticmethod
+    def _convert_record(data_dict, converters_by_field) -> dict:
+        # Only fields that have converters are visited; everything else is copied across as-is.
+        record = dict(data_dict)
+        for field_name, converters in converters_by_field.items():
+            value = record.get(field_name)
+            if value is None:
+                continue
+            for converter in converters:
                 try:
-                    type_signature = ":".join(t).rstrip(":")
-                    try:
-                        return SERIALIZE_MAP[type_signature](value)
-                    except KeyError:
-                        return SERIALIZE_MAP[t[0]](value)
+                    record[field_name] = converter(value)
+                    break
                 except (ValueError, TypeError, KeyError):
                     pass
-
-        # If we got a value that is not part of the schema, pass it
-        # through and let pydantic sort it out.
-        return value
+        # If we got a value that is not part of the schema, it is passed
+        # through and pydantic sorts it out.
+        return record
 
     def serialize_record(self, data_dict) -> dict:
         """
         Apply converters to non-native types
         """
-        return {
-            field_name: self._serialize_field(field_name, value)
-            for field_name, value in data_dict.items()
-        }
-
-    def _deserialize_field(self, field_name, value):
-        field_types = self._get_type_possibilities(field_name)
-        if value is not None:
-            for t in field_types:
-                try:
-                    type_signature = ":".join(t).rstrip(":")
-                    try:
-                        return DESERIALIZE_MAP[type_signature](value)
-                    except KeyError:
-                        return DESERIALIZE_MAP[t[0]](value)
-                except (ValueError, TypeError, KeyError):
-                    pass
-
-        return value
+        return self._convert_record(data_dict, self._serializers)
 
     def deserialize_record(self, data_dict) -> dict:
         """
         Apply converters to non-native types
         """
-        return {
-            field_name: self._deserialize_field(field_name, value)
-            for field_name, value in data_dict.items()
-        }
+        return self._convert_record(data_dict, self._deserializers)
 
 
 class DynamoIterableResult(IterableResult):
@@ -212,6 +467,9 @@ class DynamoIterableResult(IterableResult):
 
 
 class Backend:
+    # Reads and writes go through the low-level client, which is safe to share between threads.
+    thread_safe = True
+
     def __init__(self, cls):
         cfg = cls.db_config
         self.cls = cls
@@ -220,6 +478,8 @@ class Backend:
         self.range_key = getattr(cfg, "range_key", None)
         self.serializer = DynamoSerializer(self.schema, ttl_field=getattr(cfg, "ttl", None))
         self.table_name = cls.get_table_name()
+        self.scan_segments = getattr(cfg, "scan_segments", 1)
+        self.batch_write_workers = getattr(cfg, "batch_write_workers", 1)
 
         self.local_indexes = getattr(cfg, "local_indexes", {})
         self.global_indexes = getattr(cfg, "global_indexes", {})
@@ -229,16 +489,29 @@ class Backend:
             self.possible_keys.add(self.range_key)
             self.index_map = {(self.hash_key, self.range_key): None}
 
-        for name, keys in dict(**self.local_indexes, **self.global_indexes).items():
+        for name, keys in chain(self.local_indexes.items(), self.global_indexes.items()):
             self.index_map[keys] = name
             for key in keys:
                 self.possible_keys.add(key)
+        # Frozen so rule_to_boto_expression can use it as its cache key without copying it per query.
+        self.possible_keys = frozenset(self.possible_keys)
+        self._index_by_keys = {}
+        for keys, name in self.index_map.items():
+            self._index_by_keys.setdefault(frozenset(keys), name)
+
+        region, endpoint = getattr(cfg, "region", "us-east-2"), getattr(cfg, "endpoint", None)
+        self.dynamodb = get_resource(region, endpoint)
+        dax_endpoint = getattr(cfg, "dax_endpoint", None)
+        if dax_endpoint:
+            self.client = get_dax_client(region, dax_endpoint)
+        else:
+            self.client = get_client(region, endpoint)
+        self._table = self.dynamodb.Table(self.table_name)
+        self._split_filters: "WeakKeyDictionary[Rule, tuple]" = WeakKeyDictionary()
 
-        self.dynamodb = boto3.resource(
-            "dynamodb",
-            region_name=getattr(cfg, "region", "us-east-2"),
-            endpoint_url=getattr(cfg, "endpoint", None),
-        )
+    def _attribute_name(self, field_name: str) -> str:
+        field = self.cls.model_fields.get(field_name)
+        return field.alias or field_name if field else field_name
 
     def _key_param_to_dict(self, key):
         _key = {
@@ -251,29 +524,134 @@ class Backend:
         return _key
 
     def _get_best_index(self, keys_used: Set[str]):
-        def score_index(index):
-            if set(index) == keys_used:
-                # perfect match
-                return 3
-            elif len(index) > len(keys_used):
-                # index match with additional filter
-                return 2
-
-            # We shouldn't get here.
+        """
+        Find the table (None) or index whose keys are exactly the keys used. Only exact matches can be
+        queried, so the lookup is a dict built once in __init__.
+        """
+        try:
+            return self._index_by_keys[frozenset(keys_used)]
+        except KeyError:
+            pass
+        if any(index_keys.issubset(keys_used) for index_keys in self._index_by_keys):
+            # Keys of an index plus other keys; we shouldn't get here.
             raise NotImplementedError()
+        return None
 
-        possible_indexes = sorted(
-            [key for key in self.index_map.keys() if set(key).issubset(keys_used)], key=score_index
-        )
+    def _split_filter(self, filter_expr: Rule):
+        """
+        Pull key conditions out of a filter expression so that it can be run as a query on the table or
+        one of its indexes instead of a full table scan. The index whose keys cover the most conditions
+        wins, with the table's own keys preferred on a tie. Returns the key condition, the keys it uses
+        and the remaining filter condition. The key condition is None when the filter can't be narrowed.
 
-        if possible_indexes:
-            return self.index_map[possible_indexes[0]]
-        return None
+        Each Rule is only split once per backend; later calls read it from `_split_filters`.
+        """
+        if filter_expr not in self._split_filters:
+            self._split_filters[filter_expr] = self._compile_split_filter(filter_expr)
+        return self._split_filters[filter_expr]
+
+    def _compile_split_filter(self, filter_expr: Rule):
+        conjuncts = split_conjunction(filter_expr.statement.expression)
+        best_key_exprs = []
+        for index_keys, index_name in self.index_map.items():
+            hash_key, range_key = (index_keys + (None,))[:2]
+            hash_expr = next((e for e in conjuncts if is_key_comparison(e, hash_key)), None)
+            if hash_expr is None:
+                continue
+            range_expr = next(
+                (e for e in conjuncts if is_key_comparison(e, range_key, RANGE_KEY_COMPARISONS)),
+                None,
+            )
+            key_exprs = [e for e in (hash_expr, range_expr) if e is not None]
+            # DynamoDB rejects a query whose filter touches the queried keys, so any other condition on
+            # them (a second bound, `!=`, ...) rules this table or index out.
+            if any(
+                expression_symbols(e) & set(index_keys)
+                for e in conjuncts
+                if not any(e is key_expr for key_expr in key_exprs)
+            ):
+                continue
+            keys_used = {e.left.name for e in key_exprs}
+            # Skip key combinations that the query would answer with a different index (or none).
+            if (
+                len(key_exprs) > len(best_key_exprs)
+                and self._get_best_index(keys_used) == index_name
+            ):
+                best_key_exprs = key_exprs
+
+        if not best_key_exprs:
+            f_expr, _ = rule_to_boto_expression(filter_expr)
+            return None, frozenset(), f_expr
+
+        keys_used = frozenset(e.left.name for e in best_key_exprs)
+        q_expr = f_expr = None
+        for expr in conjuncts:
+            if any(expr is key_expr for key_expr in best_key_exprs):
+                condition, _ = expression_to_condition(expr, keys_used)
+                q_expr = condition if q_expr is None else q_expr & condition
+            else:
+                condition, _ = expression_to_condition(expr, set())
+                f_expr = condition if f_expr is None else f_expr & condition
+        return q_expr, keys_used, f_expr
+
+    def _iter_pages(self, operation, params: dict):
+        """
+        Yield each response of a query or scan. DynamoDB returns at most 1MB per call so, unless the
+        caller asked for a single page with a limit, keep following LastEvaluatedKey until every page
+        has been read.
+        """
+        while True:
+            resp = operation(**params)
+            yield resp
+            last_key = resp.get("LastEvaluatedKey")
+            if "Limit" in params or not last_key:
+                return
+            params = dict(params, ExclusiveStartKey=last_key)
+
+    def _read_raw_pages(self, operation, params: dict):
+        result = {"Count": 0, "ScannedCount": 0}
+        records = []
+        last_key = None
+        for resp in self._iter_pages(operation, params):
+            records.extend(
+                self.serializer.deserialize_record(from_attribute_values(rec))
+                for rec in resp.get("Items", [])
+            )
+            result["Count"] += resp["Count"]
+            result["ScannedCount"] += resp["ScannedCount"]
+            last_key = resp.get("LastEvaluatedKey")
+        result["LastEvaluatedKey"] = last_key and from_attribute_values(last_key)
+        return result, records
+
+    def _read_pages(self, operation, params: dict) -> DynamoIterableResult:
+        """Run a query or scan, reading every page unless a limit was given."""
+        result, records = self._read_raw_pages(operation, params)
+        return DynamoIterableResult(self.cls, result, records)
+
+    def _parallel_scan(self, params: dict) -> DynamoIterableResult:
+        """
+        Read the whole table as `scan_segments` segments at once. Each segment is scanned in its own
+        thread through the (thread-safe) low-level client.
+        """
+
+        def scan_segment(segment):
+            return self._read_raw_pages(
+                self.client.scan, dict(params, Segment=segment, TotalSegments=self.scan_segments)
+            )
+
+        result = {"Count": 0, "ScannedCount": 0}
+        records = []
+        with ThreadPoolExecutor(max_workers=self.scan_segments) as executor:
+            for segment_result, segment_records in executor.map(
+                scan_segment, range(self.scan_segments)
+            ):
+                result["Count"] += segment_result["Count"]
+                result["ScannedCount"] += segment_result["ScannedCount"]
+                records.extend(segment_records)
+        return DynamoIterableResult(self.cls, result, records)
 
     def initialize(self):
         schema = self.schema
-        gsies = {k: v for k, v in self.global_indexes.items()}
-        lsies = {k: v for k, v in self.local_indexes.items()}
         key_names = [key for key in [self.hash_key, self.range_key] if key]
 
         table_schema = dict(
@@ -293,27 +671,55 @@ class Backend:
             ],
             ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
         )
-        if lsies:
+        if self.local_indexes:
             table_schema["LocalSecondaryIndexes"] = [
-                index_definition(index_name, keys) for index_name, keys in lsies.items()
+                index_definition(index_name, keys)
+                for index_name, keys in self.local_indexes.items()
             ]
-        if gsies:
+        if self.global_indexes:
             table_schema["GlobalSecondaryIndexes"] = [
-                index_definition(index_name, keys, gsi=True) for index_name, keys in gsies.items()
+                index_definition(index_name, keys, gsi=True)
+                for index_name, keys in self.global_indexes.items()
             ]
         table = self.dynamodb.create_table(**table_schema)
         table.wait_until_exists()
 
     def get_table(self):
-        return self.dynamodb.Table(self.table_name)
+        return self._table
 
     def exists(self):
         table = self.get_table()
         try:
+            # The table handle is shared, so make sure we're not looking at a stale status.
+            table.reload()
             return table.table_status == "ACTIVE"
         except ClientError:
             return False
 
+    def _client_error(self, e: ClientError, key=None) -> Exception:
+        """
+        Map a ClientError from a read to the pydanticrud exception for it: a missing table becomes
+        DoesNotExist. Anything else is returned unchanged.
+        """
+        if e.response["Error"]["Code"] == "ResourceNotFoundException":
+            return DoesNotExist(f'{self.table_name} "{key}" does not exist')
+        return e
+
+    def _compile_rules(self, query_expr: Optional[Rule], filter_expr: Optional[Rule]):
+        if query_expr:
+            q_expr, keys_used = rule_to_boto_expression(query_expr, self.possible_keys)
+            f_expr, _ = rule_to_boto_expression(filter_expr) if filter_expr else (None, set())
+
+            if not keys_used and not filter_expr:
+                raise ConditionCheckFailed(
+                    "No keys in query expression. Use a filter expression or add an index."
+                )
+        elif filter_expr:
+            q_expr, keys_used, f_expr = self._split_filter(filter_expr)
+        else:
+            q_expr, keys_used, f_expr = None, set(), None
+        return q_expr, keys_used, f_expr
+
     def query(
         self,
         query_expr: Optional[Rule] = None,
@@ -322,27 +728,73 @@ class Backend:
         exclusive_start_key: Optional[str] = None,
         order: str = "asc",
         select: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
     ):
-        table = self.get_table()
-        f_expr, _ = rule_to_boto_expression(filter_expr) if filter_expr else (None, set())
+        q_expr, keys_used, f_expr = self._compile_rules(query_expr, filter_expr)
+        return self._query(
+            q_expr,
+            keys_used,
+            f_expr,
+            limit=limit,
+            exclusive_start_key=exclusive_start_key,
+            order=order,
+            select=select,
+            fields=fields,
+        )
+
+    def iter_query(
+        self,
+        query_expr: Optional[Rule] = None,
+        filter_expr: Optional[Rule] = None,
+        order: str = "asc",
+        fields: Optional[Iterable[str]] = None,
+    ):
+        """
+        Like `query` but yield records as each page arrives instead of reading every page first, so
+        memory use is bounded by the page size however many items match.
+        """
+        q_expr, keys_used, f_expr = self._compile_rules(query_expr, filter_expr)
+        operation, params = self._request(q_expr, keys_used, f_expr, order=order, fields=fields)
+        try:
+            for resp in self._iter_pages(operation, params):
+                for rec in resp.get("Items", []):
+                    yield self.serializer.deserialize_record(from_attribute_values(rec))
+        except ClientError as e:
+            error = self._client_error(e)
+            if isinstance(error, DoesNotExist):
+                return
+            raise error
 
-        params = {}
+    def _request(
+        self,
+        q_expr,
+        keys_used: Set[str],
+        f_expr,
+        limit: Optional[int] = None,
+        exclusive_start_key: Optional[str] = None,
+        order: str = "asc",
+        select: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+    ):
+        """
+        Build the client operation and parameters for a query with already compiled key and filter
+        conditions, or a scan when there is no key condition.
+        """
+        params = {"TableName": self.table_name}
 
         if limit:
             params["Limit"] = limit
         if exclusive_start_key:
-            params["ExclusiveStartKey"] = exclusive_start_key
+            params["ExclusiveStartKey"] = to_attribute_values(exclusive_start_key)
         if f_expr:
             params["FilterExpression"] = f_expr
+        if fields:
+            # Placeholders keep reserved words like "name" usable as attribute names.
+            names = {f"#f{i}": self._attribute_name(field) for i, field in enumerate(fields)}
+            params["ProjectionExpression"] = ", ".join(names)
+            params["ExpressionAttributeNames"] = names
 
-        if query_expr:
-            q_expr, keys_used = rule_to_boto_expression(query_expr, self.possible_keys)
-
-            if not keys_used and not filter_expr:
-                raise ConditionCheckFailed(
-                    "No keys in query expression. Use a filter expression or add an index."
-                )
-
+        if q_expr is not None:
             index_name = self._get_best_index(keys_used)
             params["KeyConditionExpression"] = q_expr
 
@@ -357,33 +809,50 @@ class Backend:
             elif not keys_used.issubset({self.hash_key, self.range_key}):
                 raise ConditionCheckFailed("No keys in expression. Enable scan or add an index.")
 
-            try:
-                resp = table.query(**params)
-            except ClientError as e:
-                if e.response["Error"]["Code"] == "ResourceNotFoundException":
-                    return []
-                raise e
-            except DynamoDBNeedsKeyConditionError:
-                raise ConditionCheckFailed(
-                    "Non-key attributes are not valid in the query expression. Use filter "
-                    "expression"
-                )
+            operation = self.client.query
         else:
             if order != "asc":
                 raise ConditionCheckFailed("Scans do not support reverse order.")
 
-            try:
-                resp = table.scan(**params)
-            except ClientError as e:
-                if e.response["Error"]["Code"] == "ResourceNotFoundException":
-                    return []
-                raise e
-
-        return DynamoIterableResult(
-            self.cls,
-            resp,
-            (self.serializer.deserialize_record(rec) for rec in resp.get("Items", [])),
+            operation = self.client.scan
+
+        try:
+            return operation, client_params(params)
+        except DynamoDBNeedsKeyConditionError:
+            raise ConditionCheckFailed(
+                "Non-key attributes are not valid in the query expression. Use filter expression"
+            )
+
+    def _query(
+        self,
+        q_expr,
+        keys_used: Set[str],
+        f_expr,
+        limit: Optional[int] = None,
+        exclusive_start_key: Optional[str] = None,
+        order: str = "asc",
+        select: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+    ):
+        operation, params = self._request(
+            q_expr,
+            keys_used,
+            f_expr,
+            limit=limit,
+            exclusive_start_key=exclusive_start_key,
+            order=order,
+            select=select,
+            fields=fields,
         )
+        try:
+            if q_expr is None and self.scan_segments > 1 and not limit and not exclusive_start_key:
+                return self._parallel_scan(params)
+            return self._read_pages(operation, params)
+        except ClientError as e:
+            error = self._client_error(e)
+            if isinstance(error, DoesNotExist):
+                return []
+            raise error
 
     def count(
         self,
@@ -405,40 +874,44 @@ class Backend:
 
     def get(self, key: Union[Dict, Any]):
         if isinstance(key, dict):
+            # Build the key condition directly rather than formatting and parsing a Rule.
+            q_expr = None
+            for name, value in key.items():
+                condition = (Key if name in self.possible_keys else Attr)(name).eq(value)
+                q_expr = condition if q_expr is None else q_expr & condition
+            keys_used = self.possible_keys.intersection(key)
+            if not keys_used:
+                raise ConditionCheckFailed(
+                    "No keys in query expression. Use a filter expression or add an index."
+                )
             try:
-                return self.query(
-                    Rule(" and ".join(f"{k} == {repr(v)}" for k, v in key.items())), limit=1
-                )[0]
+                return self._query(q_expr, keys_used, None, limit=1)[0]
             except IndexError:
                 raise DoesNotExist(f'{self.table_name} "{key}" does not exist')
 
         _key: Dict[str, str] = self._key_param_to_dict(key)
         try:
-            resp = self.get_table().get_item(Key=_key)
+            resp = self.client.get_item(TableName=self.table_name, Key=to_attribute_values(_key))
         except ClientError as e:
-            if e.response["Error"]["Code"] == "ResourceNotFoundException":
-                raise DoesNotExist(f'{self.table_name} "{_key}" does not exist')
-            raise e
+            raise self._client_error(e, _key)
 
         if "Item" not in resp:
             if not self.range_key:
                 _key = key
             raise DoesNotExist(f'{self.table_name} "{_key}" does not exist')
 
-        return self.serializer.deserialize_record(resp["Item"])
+        return self.serializer.deserialize_record(from_attribute_values(resp["Item"]))
 
     def save(self, item, condition: Optional[Rule] = None) -> bool:
-        data = self.serializer.serialize_record(item.dict(by_alias=True))
+        data = self.serializer.serialize_record(item.model_dump(by_alias=True))
+        params = {"TableName": self.table_name, "Item": to_attribute_values(data)}
 
         try:
             if condition:
-                expr, _ = rule_to_boto_expression(condition, self.possible_keys)
-                res = self.get_table().put_item(
-                    Item=data,
-                    ConditionExpression=expr,
+                params["ConditionExpression"], _ = rule_to_boto_expression(
+                    condition, self.possible_keys
                 )
-            else:
-                res = self.get_table().put_item(Item=data)
+            res = self.client.put_item(**client_params(params))
             return res["ResponseMetadata"]["HTTPStatusCode"] == 200
 
         except ClientError as e:
@@ -447,7 +920,9 @@ class Backend:
             raise e
 
     def delete(self, key):
-        self.get_table().delete_item(Key=self._key_param_to_dict(key))
+        self.client.delete_item(
+            TableName=self.table_name, Key=to_attribute_values(self._key_param_to_dict(key))
+        )
 
     def batch_save(self, items: list) -> dict:
         """
@@ -456,22 +931,99 @@ class Backend:
         Refer docs:
         https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/batch_write_item.html
         """
-        # Prepare the batch write requests
-        request_items = {self.table_name: []}
+        return self._write_requests(
+            [
+                {
+                    "PutRequest": {
+                        "Item": to_attribute_values(
+                            self.serializer.serialize_record(item.model_dump(by_alias=True))
+                        )
+                    }
+                }
+                for item in items
+            ]
+        )
+
+    def batch_delete(self, keys: list) -> dict:
+        """
+        Delete many records by key with BatchWriteItem. Keys take the same form as `get`. Returns the
+        unprocessed deletes in the same shape as `batch_save`.
+        """
+        return self._write_requests(
+            [
+                {"DeleteRequest": {"Key": to_attribute_values(self._key_param_to_dict(k))}}
+                for k in keys
+            ]
+        )
+
+    def _write_requests(self, requests: list) -> dict:
+        unprocessed_items = {}
 
         # chunk list for size limit of 25 items to write using this batch_write operation refer below.
         # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/batch_write_item.html#:~:text=The%20BatchWriteItem%20operation,Data%20Types.
-        for chunk in chunk_list(items, 25):
-            serialized_items = [
-                self.serializer.serialize_record(item.dict(by_alias=True)) for item in chunk
-            ]
-            for serialized_item in serialized_items:
-                request_items[self.table_name].append({"PutRequest": {"Item": serialized_item}})
-        try:
-            response = self.dynamodb.batch_write_item(RequestItems=request_items)
-        except ClientError as e:
-            raise e
-        except (ValueError, TypeError, KeyError) as ex:
-            raise ex
-        unprocessed_items = response.get("UnprocessedItems", {})
+        chunks = list(chunk_list(requests, 25))
+        if self.batch_write_workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.batch_write_workers) as executor:
+                results = list(executor.map(self._write_batch, chunks))
+        else:
+            results = map(self._write_batch, chunks)
+
+        for result in results:
+            for table_name, requests in result.items():
+                unprocessed_items.setdefault(table_name, []).extend(
+                    {
+                        request_type: {
+                            field: from_attribute_values(value) for field, value in body.items()
+                        }
+                        for request_type, body in r.items()
+                    }
+                    for r in requests
+                )
         return unprocessed_items
+
+    def _write_batch(self, requests: list) -> dict:
+        """
+        Send one BatchWriteItem request, resending whatever DynamoDB leaves unprocessed (usually due to
+        throttling) with exponential backoff. Returns the items still unprocessed after the last attempt.
+        """
+        request_items = {self.table_name: requests}
+        for attempt in range(BATCH_ATTEMPTS):
+            if attempt:
+                sleep(backoff_delay(attempt))
+            request_items = self.client.batch_write_item(RequestItems=request_items).get(
+                "UnprocessedItems"
+            )
+            if not request_items:
+                return {}
+        return request_items
+
+    def batch_get(self, keys: list) -> list:
+        """
+        Fetch many records by key, 100 keys per request (the BatchGetItem limit). Keys take the same
+        form as `get`. Records are returned in no particular order and missing keys are skipped.
+        Unprocessed keys are retried with backoff; `BatchGetIncomplete` is raised if any remain.
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/batch_get_item.html
+        """
+        records = []
+        for chunk in chunk_list(keys, 100):
+            request_items = {
+                self.table_name: {
+                    "Keys": [to_attribute_values(self._key_param_to_dict(k)) for k in chunk]
+                }
+            }
+            for attempt in range(BATCH_ATTEMPTS):
+                if attempt:
+                    sleep(backoff_delay(attempt))
+                response = self.client.batch_get_item(RequestItems=request_items)
+                records.extend(
+                    self.serializer.deserialize_record(from_attribute_values(rec))
+                    for rec in response["Responses"].get(self.table_name, [])
+                )
+                request_items = response.get("UnprocessedKeys")
+                if not request_items:
+                    break
+            else:
+                raise BatchGetIncomplete(
+                    [from_attribute_values(k) for k in request_items[self.table_name]["Keys"]]
+                )
+        return records
@@ -1,10 +1,18 @@
-class DoesNotExist(BaseException):
+class DoesNotExist(Exception):
     """Occurs when a requested record does not exist."""
 
     pass
 
 
-class ConditionCheckFailed(BaseException):
+class ConditionCheckFailed(Exception):
     """Occurs when the backend fails to complete an operation with a condition."""
 
     pass
+
+
+class BatchGetIncomplete(Exception):
+    """Occurs when the backend still leaves keys unread after retrying a batch read."""
+
+    def __init__(self, unprocessed_keys: list):
+        super().__init__(f"{len(unprocessed_keys)} keys were left unprocessed")
+        self.unprocessed_keys = unprocessed_keys
@@ -1,3 +1,5 @@
+import asyncio
+from functools import partial
 from warnings import warn
 from pydantic import BaseModel as PydanticBaseModel
 from pydantic._internal._model_construction import ModelMetaclass
@@ -11,13 +13,40 @@ class CrudMetaClass(ModelMetaclass):
         return cls
 
 
+async def _call_backend(cls, method, *args, **kwargs):
+    """
+    Run a blocking model method without blocking the event loop. Backends that can be used from any
+    thread run in the loop's default executor, so many calls can be awaited together with
+    asyncio.gather(); the others run inline.
+    """
+    if not getattr(cls.__backend__, "thread_safe", False):
+        return method(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(method, *args, **kwargs))
+
+
 class IterableResult:
     def __init__(self, cls, records, count=None):
-        self.records = [cls.parse_obj(i) for i in records]
+        # Records are only validated into model instances when they are first accessed, so callers
+        # that stop early (or only want the first few) don't pay for the rest.
+        self._cls = cls
+        self._raw_records = list(records)
+        self._records = [None] * len(self._raw_records)
         self.count = count  # None indicates "unknown"
 
         self._current_index = 0
 
+    @property
+    def records(self) -> list:
+        return self[:]
+
+    def _record(self, index):
+        record = self._records[index]
+        if record is None:
+            record = self._records[index] = self._cls.model_validate(self._raw_records[index])
+            self._raw_records[index] = None
+        return record
+
     def __len__(self):
         return self.count
 
@@ -25,11 +54,13 @@ class IterableResult:
         return self
 
     def __getitem__(self, indices):
-        return self.records.__getitem__(indices)
+        if isinstance(indices, slice):
+            return [self._record(i) for i in range(*indices.indices(len(self._records)))]
+        return self._record(indices)
 
     def __next__(self):
         try:
-            member = self.records[self._current_index]
+            member = self._record(self._current_index)
             self._current_index += 1
             return member
         except IndexError:
@@ -62,6 +93,11 @@ class BaseModel(PydanticBaseModel, metaclass=CrudMetaClass):
             res = IterableResult(cls, res)
         return res
 
+    @classmethod
+    def iter_query(cls, *args, **kwargs):
+        for record in cls.__backend__.iter_query(*args, **kwargs):
+            yield cls.model_validate(record)
+
     @classmethod
     def count(cls, *args, **kwargs):
         return cls.__backend__.count(*args, **kwargs)
@@ -71,11 +107,16 @@ class BaseModel(PydanticBaseModel, metaclass=CrudMetaClass):
         return cls.model_validate(cls.__backend__.get(*args, **kwargs))
 
     def save(self) -> bool:
-        # Parse the new obj to trigger validation
-        self.__class__.model_validate(self.model_dump(by_alias=True))
+        # Parse the new obj to trigger validation, unless assignments are already validated or the model
+        # opted out.
+        cls = self.__class__
+        if getattr(
+            cls.db_config, "validate_on_save", not cls.model_config.get("validate_assignment")
+        ):
+            cls.model_validate(self.model_dump(by_alias=True))
 
         # Maybe we should pass a conditional to the backend but for now the only place that uses it doesn't need it.
-        return self.__class__.__backend__.save(self)
+        return cls.__backend__.save(self)
 
     @classmethod
     def delete(cls, *args, **kwargs):
@@ -84,3 +125,38 @@ class BaseModel(PydanticBaseModel, metaclass=CrudMetaClass):
     @classmethod
     def batch_save(cls, *args, **kwargs):
         return cls.__backend__.batch_save(*args, **kwargs)
+
+    @classmethod
+    def batch_delete(cls, *args, **kwargs):
+        return cls.__backend__.batch_delete(*args, **kwargs)
+
+    @classmethod
+    def batch_get(cls, *args, **kwargs):
+        return [cls.model_validate(i) for i in cls.__backend__.batch_get(*args, **kwargs)]
+
+    @classmethod
+    async def aget(cls, *args, **kwargs):
+        return await _call_backend(cls, cls.get, *args, **kwargs)
+
+    @classmethod
+    async def aquery(cls, *args, **kwargs):
+        return await _call_backend(cls, cls.query, *args, **kwargs)
+
+    async def asave(self) -> bool:
+        return await _call_backend(self.__class__, self.save)
+
+    @classmethod
+    async def adelete(cls, *args, **kwargs):
+        return await _call_backend(cls, cls.delete, *args, **kwargs)
+
+    @classmethod
+    async def abatch_save(cls, *args, **kwargs):
+        return await _call_backend(cls, cls.batch_save, *args, **kwargs)
+
+    @classmethod
+    async def abatch_get(cls, *args, **kwargs):
+        return await _call_backend(cls, cls.batch_get, *args, **kwargs)
+
+    @classmethod
+    async def abatch_delete(cls, *args, **kwargs):
+        return await _call_backend(cls, cls.batch_delete, *args, **kwargs)
@@ -3,13 +3,25 @@ from decimal import Decimal
 from datetime import datetime, timedelta, timezone
 from uuid import uuid4, UUID
 import random
+import asyncio
+import sys
+from types import SimpleNamespace
 
+import boto3
 import docker
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
 from botocore.exceptions import ClientError
 from pydantic import model_validator, BaseModel as PydanticBaseModel, Field, ValidationError
 from pydanticrud import BaseModel, DynamoDbBackend, ConditionCheckFailed
 import pytest
-from pydanticrud.exceptions import DoesNotExist
+from pydanticrud.exceptions import DoesNotExist, BatchGetIncomplete
+from pydanticrud.backends.dynamodb import (
+    BATCH_ATTEMPTS,
+    _create_client,
+    _to_epoch_decimal,
+    rule_to_boto_expression,
+    to_attribute_values,
+)
 from rule_engine import Rule
 
 from .random_values import random_datetime, random_unique_name, future_datetime
@@ -125,7 +137,7 @@ def simple_model_data_generator(**kwargs):
     data = dict(
         id=random.randint(0, 100000),
         value=random.randint(0, 100000),
-        name=random_unique_name(),
+        name=kwargs.get("name") or random_unique_name(),
         total=round(random.random(), 9),
         timestamp=random_datetime(),
         expires=(datetime.utcnow() + timedelta(seconds=random.randint(0, 10))).replace(
@@ -329,6 +341,61 @@ def test_save_get_delete_simple(dynamo, simple_table):
         SimpleKeyModel.get(data["name"])
 
 
+def test_async_save_get_delete_simple(dynamo, simple_table):
+    models = [
+        SimpleKeyModel.model_validate(simple_model_data_generator(name=f"async-{i}"))
+        for i in range(5)
+    ]
+
+    async def run():
+        assert all(await asyncio.gather(*(m.asave() for m in models)))
+        try:
+            return await asyncio.gather(*(SimpleKeyModel.aget(m.name) for m in models))
+        finally:
+            await asyncio.gather(*(SimpleKeyModel.adelete(m.name) for m in models))
+
+    assert asyncio.run(run()) == models
+    with pytest.raises(DoesNotExist):
+        SimpleKeyModel.get(models[0].name)
+
+
+def test_save_to_missing_table_raises_client_error(monkeypatch):
+    def put_item(**params):
+        raise ClientError(
+            {"Error": {"Code": "ResourceNotFoundException", "Message": "not found"}}, "PutItem"
+        )
+
+    monkeypatch.setattr(SimpleKeyModel.__backend__, "client", SimpleNamespace(put_item=put_item))
+    with pytest.raises(ClientError):
+        SimpleKeyModel.model_validate(simple_model_data_generator(name="missing-table")).save()
+
+
+def test_save_with_condition(dynamo, simple_table):
+    data = simple_model_data_generator(value=1)
+    backend = SimpleKeyModel.__backend__
+    try:
+        assert backend.save(
+            SimpleKeyModel.model_validate(data), condition=Rule("value == 5 or value == null")
+        )
+
+        data["value"] = 2
+        with pytest.raises(ConditionCheckFailed):
+            backend.save(SimpleKeyModel.model_validate(data), condition=Rule("value == 5"))
+        assert SimpleKeyModel.get(data["name"]).value == 1
+
+        assert backend.save(SimpleKeyModel.model_validate(data), condition=Rule("value == 1"))
+        assert SimpleKeyModel.get(data["name"]).value == 2
+    finally:
+        SimpleKeyModel.delete(data["name"])
+
+
+def test_to_epoch_decimal_treats_naive_datetimes_as_utc():
+    aware = datetime(2020, 5, 17, 3, 4, 5, 250000, tzinfo=timezone.utc)
+    assert str(_to_epoch_decimal(aware)) == "1589684645.25"
+    assert str(_to_epoch_decimal(aware.replace(microsecond=1))) == "1589684645.000001"
+    assert _to_epoch_decimal(aware.replace(tzinfo=None)) == _to_epoch_decimal(aware)
+
+
 def test_save_ttl_field_is_float(dynamo, simple_query_data):
     """DynamoDB requires ttl fields to be a float in order to be successfully processed. Boto provides the ability to
     set a float via a decimal (but not a float strangely)."""
@@ -406,6 +473,191 @@ def test_query_scan_simple(dynamo, simple_query_data):
     assert res_data == {d["name"]: d for d in data_by_timestamp[:2]}
 
 
+def test_query_parallel_scan(dynamo, simple_query_data, monkeypatch):
+    monkeypatch.setattr(SimpleKeyModel.__backend__, "scan_segments", 4)
+    data_by_timestamp = sorted(simple_query_data, key=lambda d: d["timestamp"])
+    res = SimpleKeyModel.query(
+        filter_expr=Rule(f"timestamp <= '{data_by_timestamp[2]['timestamp']}'"),
+        fields=list(SimpleKeyModel.model_fields),
+    )
+    res_data = {m.name: m.dict() for m in res}
+    assert res_data == {d["name"]: d for d in data_by_timestamp[:2]}
+    assert len(res) == 2
+
+
+def test_query_filter_on_hash_key_avoids_scan(dynamo, simple_query_data):
+    record = simple_query_data[1]
+    res = SimpleKeyModel.query(
+        filter_expr=Rule(f"name == '{record['name']}' and value == {record['value']}")
+    )
+    res_data = {m.name: m.dict() for m in res}
+    assert res_data == {record["name"]: record}
+    # Only the matching item was read, so this ran as a query rather than a scan.
+    assert res.scanned_count == 1
+
+
+def test_query_filter_on_indexed_key_avoids_scan(dynamo, simple_query_data):
+    record = simple_query_data[2]
+    res = SimpleKeyModel.query(
+        filter_expr=Rule(f"value == {record['value']} and id == {record['id']}")
+    )
+    res_data = {m.name: m.dict() for m in res}
+    assert res_data == {record["name"]: record}
+    assert res.scanned_count == 1
+
+
+def test_query_filter_on_local_index_complex(dynamo, complex_query_data):
+    record = complex_query_data[0]
+    res = ComplexKeyModel.query(
+        filter_expr=Rule(
+            f"category_id == {record['category_id']} and account == '{record['account']}' "
+            f"and thread_id == '{record['thread_id']}'"
+        )
+    )
+    res_data = {(m.account, m.thread_id): m.dict() for m in res}
+    assert res_data == {(record["account"], record["thread_id"]): record}
+    # Only this account's items in the category were read.
+    assert res.scanned_count == len(
+        [
+            d
+            for d in complex_query_data
+            if d["account"] == record["account"] and d["category_id"] == record["category_id"]
+        ]
+    )
+
+
+def test_query_with_fields_projection(dynamo, simple_query_data):
+    record = simple_query_data[1]
+    fields = [f for f in SimpleKeyModel.model_fields if f != "data"]
+    res = SimpleKeyModel.query(filter_expr=Rule(f"name == '{record['name']}'"), fields=fields)
+    assert len(res[:]) == 1
+    # "data" wasn't fetched, so it falls back to the model default.
+    assert res[0].data == {}
+    assert res[0].model_dump(exclude={"data"}) == {k: v for k, v in record.items() if k != "data"}
+
+
+def test_rule_to_boto_expression_is_memoized():
+    rule = Rule("name == 'x' and value > 3")
+    condition, keys_used = rule_to_boto_expression(rule, {"name"})
+    assert keys_used == {"name"}
+    assert rule_to_boto_expression(rule, {"name"})[0] is condition
+    # A different key set compiles separately.
+    assert rule_to_boto_expression(rule)[1] == set()
+
+
+def test_get_best_index():
+    backend = ComplexKeyModel.__backend__
+    assert backend._get_best_index({"account", "sort_date_key"}) is None
+    assert backend._get_best_index({"account", "thread_id"}) == "by-thread"
+    assert backend._get_best_index({"account"}) is None
+    with pytest.raises(NotImplementedError):
+        backend._get_best_index({"account", "thread_id", "category_id"})
+
+
+def test_split_filter_is_memoized():
+    backend = SimpleKeyModel.__backend__
+    rule = Rule("name == 'x' and value > 3")
+    q_expr, keys_used, f_expr = backend._split_filter(rule)
+    assert keys_used == {"name"}
+    assert backend._split_filter(rule)[0] is q_expr
+
+
+def test_split_filter_keeps_the_range_key_in_the_key_condition():
+    backend = ComplexKeyModel.__backend__
+    q_expr, keys_used, f_expr = backend._split_filter(
+        Rule("account == 'a' and sort_date_key > 'a' and category_id == 3")
+    )
+    assert keys_used == {"account", "sort_date_key"}
+    assert f_expr is not None
+
+
+def test_split_filter_scans_when_range_key_has_two_bounds():
+    # DynamoDB won't accept the second bound in a query's FilterExpression.
+    backend = ComplexKeyModel.__backend__
+    rule = Rule("account == 'a' and sort_date_key > 'a' and sort_date_key < 'd'")
+    assert backend._split_filter(rule)[:2] == (None, frozenset())
+
+
+def test_split_filter_scans_on_range_key_inequality():
+    backend = ComplexKeyModel.__backend__
+    rule = Rule("account == 'a' and sort_date_key != 'b'")
+    assert backend._split_filter(rule)[:2] == (None, frozenset())
+
+
+def test_rule_to_boto_expression_keeps_both_sides_of_and():
+    condition, keys_used = rule_to_boto_expression(Rule("name == 'x' and value > 3"), {"name"})
+    expression = ConditionExpressionBuilder().build_expression(condition)
+    assert expression.condition_expression == "(#n0 = :v0 AND #n1 > :v1)"
+    assert expression.attribute_name_placeholders == {"#n0": "name", "#n1": "value"}
+    assert expression.attribute_value_placeholders == {":v0": "x", ":v1": 3}
+    assert keys_used == {"name"}
+
+
+def test_rule_to_boto_expression_keeps_every_clause_of_or_and_nested_logic():
+    condition, keys_used = rule_to_boto_expression(
+        Rule("(value < 3 or value > 9) and name != 'x' and enabled == null")
+    )
+    expression = ConditionExpressionBuilder().build_expression(condition)
+    assert expression.condition_expression == (
+        "(((#n0 < :v0 OR #n1 > :v1) AND #n2 <> :v2) AND attribute_not_exists(#n3))"
+    )
+    assert expression.attribute_name_placeholders == {
+        "#n0": "value",
+        "#n1": "value",
+        "#n2": "name",
+        "#n3": "enabled",
+    }
+    assert expression.attribute_value_placeholders == {":v0": 3, ":v1": 9, ":v2": "x"}
+    assert keys_used == set()
+
+
+def fake_paged_operation(names):
+    """Build a fake scan/query callable serving one record per name across two pages."""
+    backend = SimpleKeyModel.__backend__
+    items = [
+        to_attribute_values(
+            backend.serializer.serialize_record(
+                SimpleKeyModel(**simple_model_data_generator(name=name)).model_dump()
+            )
+        )
+        for name in names
+    ]
+    last_key = {"name": {"S": names[1]}}
+    pages = [
+        {"Items": items[:2], "Count": 2, "ScannedCount": 4, "LastEvaluatedKey": last_key},
+        {"Items": items[2:], "Count": len(items) - 2, "ScannedCount": 3},
+    ]
+    calls = []
+
+    def operation(**params):
+        calls.append(params)
+        return pages[len(calls) - 1]
+
+    return operation, calls, last_key
+
+
+def test_query_reads_every_page():
+    names = ["page-0", "page-1", "page-2"]
+    operation, calls, last_key = fake_paged_operation(names)
+    res = SimpleKeyModel.__backend__._read_pages(operation, {})
+    assert calls == [{}, {"ExclusiveStartKey": last_key}]
+    assert [m.name for m in res] == names
+    assert res.count == 3
+    assert res.scanned_count == 7
+    assert res.last_evaluated_key is None
+
+
+def test_iter_query_reads_pages_on_demand(monkeypatch):
+    names = ["page-0", "page-1", "page-2"]
+    operation, calls, last_key = fake_paged_operation(names)
+    monkeypatch.setattr(SimpleKeyModel.__backend__, "client", SimpleNamespace(scan=operation))
+    res = SimpleKeyModel.iter_query()
+    assert next(res).name == names[0]
+    assert len(calls) == 1
+    assert [m.name for m in res] == names[1:]
+    assert calls[1]["ExclusiveStartKey"] == last_key
+
+
 def test_query_scan_contains_simple(dynamo, simple_query_data):
     res = SimpleKeyModel.query(filter_expr=Rule(f"'{simple_query_data[2]['items'][1]}' in items"))
     res_data = {m.name: m.dict() for m in res}
@@ -657,6 +909,64 @@ def test_batch_write(dynamo, complex_table):
     assert res_query.records == [data[0]]
 
 
+def test_batch_write_and_get_more_than_one_request(dynamo, complex_table):
+    data = [ComplexKeyModel.model_validate(complex_model_data_generator()) for x in range(0, 30)]
+    assert ComplexKeyModel.batch_save(data) == {}
+    try:
+        res = ComplexKeyModel.batch_get([(m.account, m.sort_date_key) for m in data])
+        key = lambda m: (m.account, m.sort_date_key)
+        assert sorted(res, key=key) == sorted(data, key=key)
+    finally:
+        for m in data:
+            ComplexKeyModel.delete((m.account, m.sort_date_key))
+
+
+def test_batch_delete(dynamo, complex_table):
+    data = [ComplexKeyModel.model_validate(complex_model_data_generator()) for x in range(0, 30)]
+    keys = [(m.account, m.sort_date_key) for m in data]
+    assert ComplexKeyModel.batch_save(data) == {}
+    assert ComplexKeyModel.batch_delete(keys) == {}
+    assert ComplexKeyModel.batch_get(keys) == []
+
+
+def test_batch_save_retries_unprocessed_items(monkeypatch):
+    backend = ComplexKeyModel.__backend__
+    data = [ComplexKeyModel.model_validate(complex_model_data_generator()) for x in range(0, 3)]
+    calls = []
+
+    class Client:
+        def batch_write_item(self, RequestItems):
+            calls.append(RequestItems)
+            if len(calls) == 1:
+                # Throttled: only the first item was written.
+                return {
+                    "UnprocessedItems": {backend.table_name: RequestItems[backend.table_name][1:]}
+                }
+            return {"UnprocessedItems": {}}
+
+    monkeypatch.setattr(backend, "client", Client())
+    monkeypatch.setattr("pydanticrud.backends.dynamodb.sleep", lambda s: None)
+    assert ComplexKeyModel.batch_save(data) == {}
+    assert [len(c[backend.table_name]) for c in calls] == [3, 2]
+
+
+def test_batch_get_gives_up_on_unprocessed_keys(monkeypatch):
+    backend = SimpleKeyModel.__backend__
+    calls = []
+
+    class Client:
+        def batch_get_item(self, RequestItems):
+            calls.append(RequestItems)
+            return {"Responses": {}, "UnprocessedKeys": RequestItems}
+
+    monkeypatch.setattr(backend, "client", Client())
+    monkeypatch.setattr("pydanticrud.backends.dynamodb.sleep", lambda s: None)
+    with pytest.raises(BatchGetIncomplete) as exc:
+        SimpleKeyModel.batch_get(["throttled"])
+    assert len(calls) == BATCH_ATTEMPTS
+    assert exc.value.unprocessed_keys == [{"name": "throttled"}]
+
+
 def test_message_batch_write_client_exception(dynamo, complex_table):
     data = [
         ComplexKeyModel.model_validate(complex_model_data_generator(body="some big string" * 10000))
@@ -667,3 +977,37 @@ def test_message_batch_write_client_exception(dynamo, complex_table):
     assert (
         exc.value.response["Error"]["Message"] == "Item size has exceeded the maximum allowed size"
     )
+
+
+def test_client_uses_the_default_session(monkeypatch):
+    monkeypatch.setattr(boto3, "DEFAULT_SESSION", None)
+    boto3.setup_default_session(
+        aws_access_key_id="PROGKEY", aws_secret_access_key="secret", region_name="eu-west-2"
+    )
+    client = _create_client(endpoint_url="http://localhost:18002")
+    assert client._request_signer._credentials.access_key == "PROGKEY"
+    assert client.meta.region_name == "eu-west-2"
+
+
+def test_dax_endpoint_uses_dax_client(monkeypatch):
+    class AmazonDaxClient:
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+
+    monkeypatch.setitem(sys.modules, "amazondax", SimpleNamespace(AmazonDaxClient=AmazonDaxClient))
+
+    class DaxModel(BaseModel):
+        name: str
+
+        class db_config:
+            table_name = "DaxTitle123"
+            hash_key = "name"
+            backend = DynamoDbBackend
+            dax_endpoint = "dax://my-cluster.l6fzcv.dax-clusters.us-east-2.amazonaws.com"
+
+    client = DaxModel.__backend__.client
+    assert isinstance(client, AmazonDaxClient)
+    assert client.kwargs == {
+        "region_name": "us-east-2",
+        "endpoint_url": DaxModel.db_config.dax_endpoint,
+    }
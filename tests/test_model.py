@@ -1,5 +1,8 @@
 from unittest.mock import patch
 
+import pytest
+from pydantic import ValidationError
+
 from pydanticrud import BaseModel
 
 
@@ -58,3 +61,15 @@ def test_model_backend_query():
 
 def test_model_table_name_from_title():
     assert Model.get_table_name() == Model.db_config.table_name.lower()
+
+
+def test_model_backend_query_validates_records_on_access():
+    records = [dict(id=1, name="two", total=3.0), dict(id="not a number", name="x", total=0.0)]
+    with patch.object(FalseBackend, "query", return_value=records):
+        m = Model.query(2)
+
+        # The invalid second record isn't validated until it is reached.
+        assert m[0].id == 1
+        assert m[-2] is m[0]
+        with pytest.raises(ValidationError):
+            m[1]
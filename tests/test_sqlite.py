@@ -1,10 +1,12 @@
 from typing import Dict, List
 from decimal import Decimal
 from datetime import datetime
+import asyncio
 
 import pytest
+from pydantic import ValidationError
 
-from pydanticrud import BaseModel, SqliteBackend
+from pydanticrud import BaseModel, SqliteBackend, DoesNotExist, ConditionCheckFailed
 from rule_engine import Rule
 
 
@@ -77,20 +79,36 @@ def test_save_and_get(model_in_db):
 
 
 def test_rule_parsing_gives_sql_equality():
-    assert Model.__backend__._rule_to_sqlite_expression(Rule(f"id == 3")) == ("id = ?", (3,))
+    assert Model.__backend__._rule_to_sqlite_expression(Rule(f"id == 3")) == ('"id" = ?', (3,))
 
 
 def test_rule_parsing_gives_sql_gt():
-    assert Model.__backend__._rule_to_sqlite_expression(Rule(f"id > 3")) == ("id > ?", (3,))
+    assert Model.__backend__._rule_to_sqlite_expression(Rule(f"id > 3")) == ('"id" > ?', (3,))
+
+
+def test_rule_parsing_gives_sql_gte():
+    assert Model.__backend__._rule_to_sqlite_expression(Rule(f"id >= 3")) == ('"id" >= ?', (3,))
 
 
 def test_rule_parsing_gives_sql_like():
     assert Model.__backend__._rule_to_sqlite_expression(Rule(f"'o' in name")) == (
-        "name like ?",
+        '"name" like ?',
         ("%o%",),
     )
 
 
+def test_rule_parsing_keeps_every_clause():
+    assert Model.__backend__._rule_to_sqlite_expression(
+        Rule("(value < 3 or value > 9) and name != 'x'")
+    ) == ('(("value" < ? OR "value" > ?) AND "name" != ?)', (3, 9, "x"))
+
+
+def test_rule_parsing_is_memoized():
+    rule = Rule("id == 3 and name == 'bob'")
+    expression = Model.__backend__._rule_to_sqlite_expression(rule)
+    assert Model.__backend__._rule_to_sqlite_expression(rule) is expression
+
+
 def test_rule_parsing_errors_on_querying_nonnative_fields():
     with pytest.raises(SyntaxError):
         Model.__backend__._rule_to_sqlite_expression(Rule(f"3 in items"))
@@ -118,3 +136,141 @@ def test_query(model_in_db):
     res = Model.query(Rule(f"id < 3"))
     data = {m.id: m.dict() for m in res}
     assert data == {1: data1, 2: data2}
+
+
+def test_iter_query(model_in_db):
+    data = [model_data_generator() for _ in range(3)]
+    for i, datum in enumerate(data):
+        datum["id"] = 150000 + i
+    Model.batch_save([Model.model_validate(d) for d in data])
+    res = Model.iter_query(Rule("id >= 150000 and id < 150003"))
+    assert {m.id: m.model_dump() for m in res} == {d["id"]: d for d in data}
+
+
+def test_save_overwrites_existing(model_in_db):
+    data = model_data_generator()
+    Model.model_validate(data).save()
+    data["name"] = "updated"
+    Model.model_validate(data).save()
+    assert Model.get(data["id"]).model_dump() == data
+
+
+def test_batch_save(model_in_db):
+    data = [model_data_generator() for _ in range(5)]
+    for i, datum in enumerate(data):
+        datum["id"] = 200000 + i
+    assert Model.batch_save([Model.model_validate(d) for d in data]) == {}
+    res = Model.query(Rule("id >= 200000"))
+    assert {m.id: m.model_dump() for m in res} == {d["id"]: d for d in data}
+
+
+def test_batch_get(model_in_db):
+    data = [model_data_generator() for _ in range(3)]
+    for i, datum in enumerate(data):
+        datum["id"] = 250000 + i
+    Model.batch_save([Model.model_validate(d) for d in data])
+    res = Model.batch_get([d["id"] for d in data] + [-1])
+    assert sorted(m.id for m in res) == [d["id"] for d in data]
+
+
+def test_batch_delete(model_in_db):
+    data = [model_data_generator() for _ in range(3)]
+    for i, datum in enumerate(data):
+        datum["id"] = 260000 + i
+    Model.batch_save([Model.model_validate(d) for d in data])
+    assert Model.batch_delete([d["id"] for d in data[:2]]) == {}
+    assert [m.id for m in Model.batch_get([d["id"] for d in data])] == [data[2]["id"]]
+
+
+def test_bulk_rolls_back_on_error(model_in_db):
+    data = model_data_generator()
+    data["id"] = 300000
+    with pytest.raises(RuntimeError):
+        with Model.__backend__.bulk():
+            Model.model_validate(data).save()
+            raise RuntimeError()
+    with pytest.raises(DoesNotExist):
+        Model.get(data["id"])
+
+
+def test_save_with_condition(model_in_db):
+    data = model_data_generator()
+    data["id"] = 400000
+    data["value"] = 1
+    backend = Model.__backend__
+    # A missing item is always inserted.
+    assert backend.save(Model.model_validate(data), condition=Rule("value == 5"))
+
+    data["value"] = 2
+    with pytest.raises(ConditionCheckFailed):
+        backend.save(Model.model_validate(data), condition=Rule("value == 5"))
+    assert Model.get(data["id"]).value == 1
+
+    assert backend.save(Model.model_validate(data), condition=Rule("value == 1"))
+    assert Model.get(data["id"]).value == 2
+
+
+def test_reads_json_columns_written_as_text(model_in_db):
+    data = model_data_generator()
+    data["id"] = 450000
+    Model.model_validate(data).save()
+    # Rows written before the JSON columns were stored as bytes hold plain text.
+    Model.__backend__._conn.execute(
+        'UPDATE "modeltitle123" SET "data" = ? WHERE "id" = ?;', ['{"a": "text"}', data["id"]]
+    )
+    assert Model.get(data["id"]).data == {"a": "text"}
+
+
+def test_async_methods_run_inline(model_in_db):
+    # The sqlite connection belongs to the thread that opened it, so nothing may move to a worker.
+    data = model_data_generator()
+
+    async def run():
+        await Model.model_validate(data).asave()
+        return await Model.aget(data["id"])
+
+    assert asyncio.run(run()).model_dump() == data
+
+
+class KeywordModel(BaseModel):
+    order: int
+    group: str
+
+    class db_config:
+        table_name = "Select"
+        hash_key = "order"
+        backend = SqliteBackend
+        database = ":memory:"
+
+
+def test_sql_keywords_as_names():
+    KeywordModel.initialize()
+    KeywordModel(order=1, group="a").save()
+    assert KeywordModel.query(Rule("group == 'a'"))[0].order == 1
+
+
+class UnvalidatedModel(BaseModel):
+    id: int
+    value: int
+
+    class db_config:
+        table_name = "Unvalidated"
+        hash_key = "id"
+        backend = SqliteBackend
+        database = ":memory:"
+        validate_on_save = False
+
+
+@pytest.mark.filterwarnings("ignore:Pydantic serializer warnings")
+def test_save_validates_by_default(model_in_db):
+    a = Model.model_validate(model_data_generator())
+    a.value = "not a number"
+    with pytest.raises(ValidationError):
+        a.save()
+
+
+def test_save_skips_validation_when_disabled():
+    UnvalidatedModel.initialize()
+    a = UnvalidatedModel(id=1, value=1)
+    a.value = "not a number"
+    assert a.save()